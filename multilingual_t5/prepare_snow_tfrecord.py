@@ -0,0 +1,90 @@
+# Copyright 2020 The mT5 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Converts the SNOW TSV files into sharded TFRecords for the `snow` task.
+
+Each TSV line is parsed once into a tf.train.Example with string "inputs" and
+"targets" features, so training reads records instead of parsing text.
+
+Usage:
+  python -m multilingual_t5.prepare_snow_tfrecord \
+    --input_pattern=./train.tsv --output_prefix=./train.tfrecord
+"""
+
+import contextlib
+import os
+
+from absl import app
+from absl import flags
+
+from multilingual_t5 import preprocessors
+import tensorflow.compat.v2 as tf
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("input_pattern", None, "File pattern of the TSV files.")
+flags.DEFINE_string("output_prefix", None, "Prefix of the output shards.")
+flags.DEFINE_integer("num_shards", 1, "Number of output shards.")
+
+FIELD_NAMES = ["inputs", "targets"]
+
+
+def _to_example(x):
+  feature = {
+      k: tf.train.Feature(bytes_list=tf.train.BytesList(value=[x[k]]))
+      for k in FIELD_NAMES
+  }
+  return tf.train.Example(features=tf.train.Features(feature=feature))
+
+
+def main(_):
+  files = tf.io.gfile.glob(FLAGS.input_pattern)
+  if not files:
+    raise ValueError("No files match %s" % FLAGS.input_pattern)
+  ds = tf.data.TextLineDataset(files)
+  ds = preprocessors.parse_tsv(ds, field_names=FIELD_NAMES)
+
+  # Write to hidden temporary files that do not match the shard pattern and
+  # only rename them once every line has been parsed, so a malformed line
+  # never leaves truncated shards behind for the `snow` task to read.
+  output_dir = os.path.dirname(FLAGS.output_prefix)
+  paths = [
+      "{}-{:05d}-of-{:05d}".format(FLAGS.output_prefix, i, FLAGS.num_shards)
+      for i in range(FLAGS.num_shards)
+  ]
+  tmp_paths = [
+      os.path.join(output_dir, ".tmp-" + os.path.basename(path))
+      for path in paths
+  ]
+  try:
+    with contextlib.ExitStack() as stack:
+      writers = [
+          stack.enter_context(tf.io.TFRecordWriter(path))
+          for path in tmp_paths
+      ]
+      for i, x in enumerate(ds.as_numpy_iterator()):
+        writers[i % FLAGS.num_shards].write(
+            _to_example(x).SerializeToString())
+  except Exception:
+    for path in tmp_paths:
+      if tf.io.gfile.exists(path):
+        tf.io.gfile.remove(path)
+    raise
+  for tmp_path, path in zip(tmp_paths, paths):
+    tf.io.gfile.rename(tmp_path, path, overwrite=True)
+
+
+if __name__ == "__main__":
+  flags.mark_flags_as_required(["input_pattern", "output_prefix"])
+  app.run(main)
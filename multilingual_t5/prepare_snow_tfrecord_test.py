@@ -0,0 +1,81 @@
+# Copyright 2020 The mT5 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for multilingual_t5.prepare_snow_tfrecord."""
+
+import os
+
+from absl.testing import absltest
+from absl.testing import flagsaver
+
+from multilingual_t5 import prepare_snow_tfrecord
+from multilingual_t5 import utils
+import tensorflow.compat.v2 as tf
+
+
+class PrepareSnowTfrecordTest(absltest.TestCase):
+
+  def test_main(self):
+    tmp_dir = self.create_tempdir().full_path
+    tsv_path = os.path.join(tmp_dir, "train.tsv")
+    output_prefix = os.path.join(tmp_dir, "train.tfrecord")
+    examples = [
+        ("今日は良い天気です。", "It is nice today."),
+        ("私は猫が好きです。", "I like cats."),
+        ("東京は日本の首都です。", "Tokyo is the capital of Japan."),
+    ]
+    with open(tsv_path, "w", encoding="utf-8") as f:
+      for inputs, targets in examples:
+        f.write("{}\t{}\n".format(inputs, targets))
+
+    with flagsaver.flagsaver(input_pattern=tsv_path,
+                             output_prefix=output_prefix,
+                             num_shards=2):
+      prepare_snow_tfrecord.main(None)
+
+    self.assertCountEqual(
+        os.listdir(tmp_dir),
+        ["train.tsv",
+         "train.tfrecord-00000-of-00002",
+         "train.tfrecord-00001-of-00002"])
+
+    dataset = utils.tfrecord_dataset_fn(
+        split="train",
+        shuffle_files=False,
+        split_to_filepattern={"train": output_prefix + "*"},
+        field_names=["inputs", "targets"])
+    self.assertCountEqual(
+        [(tf.compat.as_text(x["inputs"]), tf.compat.as_text(x["targets"]))
+         for x in dataset.as_numpy_iterator()],
+        examples)
+
+  def test_main_malformed_line_writes_no_shards(self):
+    tmp_dir = self.create_tempdir().full_path
+    tsv_path = os.path.join(tmp_dir, "train.tsv")
+    with open(tsv_path, "w", encoding="utf-8") as f:
+      f.write("inputs\ttargets\n")
+      f.write("only one field\n")
+
+    with flagsaver.flagsaver(
+        input_pattern=tsv_path,
+        output_prefix=os.path.join(tmp_dir, "train.tfrecord")):
+      with self.assertRaises(tf.errors.InvalidArgumentError):
+        prepare_snow_tfrecord.main(None)
+
+    self.assertEqual(os.listdir(tmp_dir), ["train.tsv"])
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -30,8 +30,13 @@ DEFAULT_TEMPERATURE = 1.0 / 0.3
 DEFAULT_MIX_RATE = functools.partial(
     t5.data.utils.rate_num_examples, temperature=DEFAULT_TEMPERATURE)
 
+# SentencePieceVocabulary reads the model file the first time it is used, so
+# building it here does not fetch anything from GCS at import time. Code in this
+# module must not touch the vocabulary (e.g. eos_id) outside of a pipeline.
 DEFAULT_VOCAB = sentencepiece_vocabulary.SentencePieceVocabulary(
     DEFAULT_SPM_PATH)
+# With add_eos=True, t5 appends EOS in-graph after the token preprocessors run.
+# Do not add a preprocessor that appends it again.
 DEFAULT_OUTPUT_FEATURES = {
     "inputs": t5.data.Feature(
         vocabulary=DEFAULT_VOCAB, add_eos=True, required=False),
@@ -46,7 +51,7 @@ MC4_LANGS = tfds.text.c4.MC4_LANGUAGES
 # traditional Chinese, and only contains "zh" (which is a mix of simplified
 # and traditional).
 # https://github.com/google-research/bert/blob/master/multilingual.md
-WIKI_LANGS = [
+WIKI_LANGS = (
     "af", "an", "ar", "ast", "az", "azb", "ba", "bar", "be", "bg", "bn", "bpy",
     "br", "bs", "ca", "ce", "ceb", "cs", "cv", "cy", "da", "de", "el", "en",
     "es", "et", "eu", "fa", "fi", "fr", "fy", "ga", "gl", "gu", "he", "hi",
@@ -56,62 +61,70 @@ WIKI_LANGS = [
     "pa", "pl", "pms", "pnb", "pt", "ro", "ru", "scn", "sco", "sh", "sk", "sl",
     "sq", "sr", "su", "sv", "sw", "ta", "te", "tg", "th", "tl", "tr", "tt",
     "uk", "ur", "uz", "vi", "vo", "war", "yo", "zh"
-]
+)
 
 # =========================== Pretraining Tasks/Mixtures =======================
 
+# mC4 and Wikipedia only provide raw text, which is used as the targets.
+pretrain_text_preprocessor = [
+    functools.partial(
+        t5.data.preprocessors.rekey,
+        key_map={"inputs": None, "targets": "text"}),
+]
+pretrain_token_preprocessor = [t5.data.preprocessors.span_corruption]
+
+# Task names use underscores where the language codes have hyphens.
+_HYPHEN_TO_UNDERSCORE = str.maketrans("-", "_")
+
 # mC4
-for lang in MC4_LANGS:
+MC4_TASKS = tuple(
+    (lang, f"mc4.{lang.translate(_HYPHEN_TO_UNDERSCORE)}")
+    for lang in MC4_LANGS)
+for lang, task_name in MC4_TASKS:
   t5.data.TaskRegistry.add(
-      "mc4.{}".format(lang.replace("-", "_")),
+      task_name,
       t5.data.TfdsTask,
       tfds_name="c4/multilingual:3.0.1",
       splits={"train": lang,
               "validation": f"{lang}-validation"},
-      text_preprocessor=functools.partial(
-          t5.data.preprocessors.rekey,
-          key_map={"inputs": None, "targets": "text"}),
-      token_preprocessor=t5.data.preprocessors.span_corruption,
+      text_preprocessor=pretrain_text_preprocessor,
+      token_preprocessor=pretrain_token_preprocessor,
       output_features=DEFAULT_OUTPUT_FEATURES,
       metric_fns=[])
 
-mc4 = ["mc4.{}".format(lang.replace("-", "_")) for lang in MC4_LANGS]
+mc4 = [task_name for _, task_name in MC4_TASKS]
 t5.data.MixtureRegistry.add("mc4", mc4, default_rate=DEFAULT_MIX_RATE)
 
 # Wikipedia
-for lang in WIKI_LANGS:
+WIKI_TASKS = tuple(
+    (lang, f"wiki.{lang.translate(_HYPHEN_TO_UNDERSCORE)}")
+    for lang in WIKI_LANGS)
+for lang, task_name in WIKI_TASKS:
   t5.data.TaskRegistry.add(
-      "wiki.{}".format(lang.replace("-", "_")),
+      task_name,
       t5.data.TfdsTask,
       tfds_name="wikipedia/20200301.{}:1.0.0".format(lang),
-      text_preprocessor=[
-          functools.partial(
-              t5.data.preprocessors.rekey,
-              key_map={
-                  "inputs": None,
-                  "targets": "text"
-              }),
-      ],
-      token_preprocessor=t5.data.preprocessors.span_corruption,
+      text_preprocessor=pretrain_text_preprocessor,
+      token_preprocessor=pretrain_token_preprocessor,
       output_features=DEFAULT_OUTPUT_FEATURES,
       metric_fns=[])
 
-wiki = ["wiki.{}".format(lang.replace("-", "_")) for lang in WIKI_LANGS]
+wiki = [task_name for _, task_name in WIKI_TASKS]
 t5.data.MixtureRegistry.add("wiki", wiki, default_rate=DEFAULT_MIX_RATE)
 
 # Mixture of mC4 and WIKI
 t5.data.MixtureRegistry.add(
-    "mc4_wiki", mc4 + wiki, default_rate=DEFAULT_MIX_RATE)
+    "mc4_wiki", [*mc4, *wiki], default_rate=DEFAULT_MIX_RATE)
 
 # =========================== Fine-tuning Tasks/Mixtures =======================
 # ----- XNLI -----
 # XNLI zero-shot task. This fine-tunes on English MNLI training data and then
 # evaluates on multilingual XNLI dev/test data.
 
-XNLI_LANGS = [
+XNLI_LANGS = (
     "ar", "bg", "de", "el", "en", "es", "fr", "hi", "ru", "sw", "th", "tr",
     "ur", "vi", "zh"
-]
+)
 
 t5.data.TaskRegistry.add(
     "xnli_train",
@@ -144,8 +157,10 @@ t5.data.TaskRegistry.add(
     ],
     output_features=DEFAULT_OUTPUT_FEATURES,
     metric_fns=[metrics.accuracy])
-xnli_zeroshot = (["xnli_train", "xnli_dev_test.all_langs"] + \
-                  ["xnli_dev_test.{}".format(lang) for lang in XNLI_LANGS])
+xnli_zeroshot = [
+    "xnli_train", "xnli_dev_test.all_langs",
+    *(f"xnli_dev_test.{lang}" for lang in XNLI_LANGS)
+]
 t5.data.MixtureRegistry.add("xnli_zeroshot", xnli_zeroshot, default_rate=1.0)
 
 # ----- PAWS -----
@@ -163,15 +178,18 @@ postprocess_fn = functools.partial(
         t5.data.postprocessors.string_label_to_class_id,
         label_classes=label_names)
 
+pawsx_kwargs = dict(
+    text_preprocessor=text_preprocessor,
+    output_features=DEFAULT_OUTPUT_FEATURES,
+    postprocess_fn=postprocess_fn,
+    metric_fns=[metrics.accuracy])
+
 t5.data.TaskRegistry.add(
     "paws",
     t5.data.TfdsTask,
     tfds_name="paws_x_wiki/en:1.0.0",
     splits=["train"],
-    text_preprocessor=text_preprocessor,
-    output_features=DEFAULT_OUTPUT_FEATURES,
-    postprocess_fn=postprocess_fn,
-    metric_fns=[metrics.accuracy])
+    **pawsx_kwargs)
 
 for lang in utils.PAWSX_LANGS:
   t5.data.TaskRegistry.add(
@@ -179,43 +197,44 @@ for lang in utils.PAWSX_LANGS:
       t5.data.TfdsTask,
       tfds_name="paws_x_wiki/{}:1.0.0".format(lang),
       splits=["validation", "test"],
-      text_preprocessor=text_preprocessor,
-      output_features=DEFAULT_OUTPUT_FEATURES,
-      postprocess_fn=postprocess_fn,
-      metric_fns=[metrics.accuracy])
+      **pawsx_kwargs)
 
   t5.data.TaskRegistry.add(
       "pawsx_translate.{}".format(lang),
       t5.data.TfdsTask,
       tfds_name="paws_x_wiki/{}:1.0.0".format(lang),
       splits=["train"],
-      text_preprocessor=text_preprocessor,
-      output_features=DEFAULT_OUTPUT_FEATURES,
-      postprocess_fn=postprocess_fn,
-      metric_fns=[metrics.accuracy])
+      **pawsx_kwargs)
 
 t5.data.TaskRegistry.add(
     "pawsx_dev_test.all_langs",
     splits=["validation", "test"],
     dataset_fn=utils.pawsx_all_langs_dataset_fn,
-    text_preprocessor=text_preprocessor,
-    output_features=DEFAULT_OUTPUT_FEATURES,
-    postprocess_fn=postprocess_fn,
-    metric_fns=[metrics.accuracy])
+    **pawsx_kwargs)
 
 # PAWSX Zero-Shot
-pawsx = ["paws"] + ["pawsx_dev_test.all_langs"] + [
-    "pawsx_dev_test.{}".format(lang) for lang in utils.PAWSX_LANGS
+pawsx = [
+    "paws", "pawsx_dev_test.all_langs",
+    *(f"pawsx_dev_test.{lang}" for lang in utils.PAWSX_LANGS)
 ]
 t5.data.MixtureRegistry.add("pawsx_zeroshot", pawsx, default_rate=1.0)
 
 pawsx_translate = [
-    "pawsx_translate.{}".format(lang) for lang in utils.PAWSX_LANGS
-] + ["pawsx_dev_test.all_langs"
-    ] + ["pawsx_dev_test.{}".format(lang) for lang in utils.PAWSX_LANGS]
+    *(f"pawsx_translate.{lang}" for lang in utils.PAWSX_LANGS),
+    "pawsx_dev_test.all_langs",
+    *(f"pawsx_dev_test.{lang}" for lang in utils.PAWSX_LANGS)
+]
 t5.data.MixtureRegistry.add(
     "pawsx_translate", pawsx_translate, default_rate=1.0)
 
+# ----- QA -----
+# TyDiQA, SQuAD and XQuAD are all processed and evaluated the same way.
+qa_kwargs = dict(
+    text_preprocessor=preprocessors.xquad,
+    postprocess_fn=t5.data.postprocessors.qa,
+    output_features=DEFAULT_OUTPUT_FEATURES,
+    metric_fns=[metrics.squad])
+
 # ----- TyDiQA GoldP-----
 # The "validation" split contains all the validation examples for all the
 # individual languages together.
@@ -225,10 +244,7 @@ t5.data.TaskRegistry.add(
     t5.data.TfdsTask,
     tfds_name="tydi_qa/goldp:2.0.0",
     splits=["train", "validation"],
-    text_preprocessor=preprocessors.xquad,
-    postprocess_fn=t5.data.postprocessors.qa,
-    output_features=DEFAULT_OUTPUT_FEATURES,
-    metric_fns=[metrics.squad])
+    **qa_kwargs)
 
 for lang in TYDIQA_LANGS:
   t5.data.TaskRegistry.add(
@@ -236,13 +252,11 @@ for lang in TYDIQA_LANGS:
       t5.data.TfdsTask,
       tfds_name="tydi_qa/goldp:2.0.0",
       splits={"validation": "validation-{}".format(lang)},
-      text_preprocessor=preprocessors.xquad,
-      postprocess_fn=t5.data.postprocessors.qa,
-      output_features=DEFAULT_OUTPUT_FEATURES,
-      metric_fns=[metrics.squad])
+      **qa_kwargs)
 
-tydiqa = (["tydiqa_train_dev"] + \
-            ["tydiqa_dev.{}".format(lang) for lang in TYDIQA_LANGS])
+tydiqa = [
+    "tydiqa_train_dev", *(f"tydiqa_dev.{lang}" for lang in TYDIQA_LANGS)
+]
 t5.data.MixtureRegistry.add("tydiqa", tydiqa, default_rate=1.0)
 
 
@@ -252,10 +266,7 @@ t5.data.TaskRegistry.add(
     t5.data.TfdsTask,
     tfds_name="squad/v1.1:2.0.0",
     splits=["train", "validation"],
-    text_preprocessor=preprocessors.xquad,
-    postprocess_fn=t5.data.postprocessors.qa,
-    output_features=DEFAULT_OUTPUT_FEATURES,
-    metric_fns=[metrics.squad])
+    **qa_kwargs)
 
 # ----- XQuAD -----
 for lang in utils.XQUAD_LANGS_TRAIN_DEV:
@@ -267,10 +278,7 @@ for lang in utils.XQUAD_LANGS_TRAIN_DEV:
           "train": "translate-train",
           "validation": "translate-dev"
       },
-      text_preprocessor=preprocessors.xquad,
-      postprocess_fn=t5.data.postprocessors.qa,
-      output_features=DEFAULT_OUTPUT_FEATURES,
-      metric_fns=[metrics.squad])
+      **qa_kwargs)
 
 for lang in utils.XQUAD_LANGS_TEST:
   t5.data.TaskRegistry.add(
@@ -278,24 +286,18 @@ for lang in utils.XQUAD_LANGS_TEST:
       t5.data.TfdsTask,
       tfds_name="xquad/{}:2.0.0".format(lang),
       splits=["test"],
-      text_preprocessor=preprocessors.xquad,
-      postprocess_fn=t5.data.postprocessors.qa,
-      output_features=DEFAULT_OUTPUT_FEATURES,
-      metric_fns=[metrics.squad])
+      **qa_kwargs)
 
 # Additional test task containing all the languages.
 t5.data.TaskRegistry.add(
     "xquad_test.all_langs",
     splits=["test"],
     dataset_fn=utils.xquad_all_langs_dataset_fn,
-    text_preprocessor=preprocessors.xquad,
-    postprocess_fn=t5.data.postprocessors.qa,
-    output_features=DEFAULT_OUTPUT_FEATURES,
-    metric_fns=[metrics.squad])
+    **qa_kwargs)
 
 # XQuAD Zero-Shot (SQuAD train, SQuAD dev, XQuAD test).
-xquad_test = ["xquad_test.{}".format(lang) for lang in utils.XQUAD_LANGS_TEST]
-xquad_zeroshot = ["squad_train_dev", "xquad_test.all_langs"] + xquad_test
+xquad_test = [f"xquad_test.{lang}" for lang in utils.XQUAD_LANGS_TEST]
+xquad_zeroshot = ["squad_train_dev", "xquad_test.all_langs", *xquad_test]
 t5.data.MixtureRegistry.add("xquad_zeroshot", xquad_zeroshot, default_rate=1.0)
 
 # XQuAD Translate-Train (English SQuAD, XQuAD translate-train,
@@ -304,11 +306,13 @@ t5.data.MixtureRegistry.add("xquad_zeroshot", xquad_zeroshot, default_rate=1.0)
 # do not include the English data. However, Fang et al (FILTER) do include
 # English data.
 xquad_translate_train_dev = [
-    "xquad_translate_train_dev.{}".format(lang)
-    for lang in utils.XQUAD_LANGS_TRAIN_DEV
-] + ["squad_train_dev"]
-xquad_translate = (xquad_translate_train_dev + \
-                    ["xquad_test.all_langs"] + xquad_test)
+    *(f"xquad_translate_train_dev.{lang}"
+      for lang in utils.XQUAD_LANGS_TRAIN_DEV),
+    "squad_train_dev"
+]
+xquad_translate = [
+    *xquad_translate_train_dev, "xquad_test.all_langs", *xquad_test
+]
 t5.data.MixtureRegistry.add(
     "xquad_translate", xquad_translate, default_rate=1.0)
 
@@ -317,38 +321,71 @@ from sumeval.metrics.lang.lang_ja import LangJA
 from sacrebleu import corpus_bleu, TOKENIZERS
 
 lang_ja = LangJA()
+# The dev set is re-scored at every evaluation during training, so memoize
+# the MeCab tokenization of each sentence.
+@functools.lru_cache(maxsize=200000)
 def tokenizer_ja(text):
   words = lang_ja.tokenize_with_preprocess(text)
   return " ".join(words)
 TOKENIZERS["ja"] = tokenizer_ja
 
+def _tokenize_ja(texts):
+  # sacrebleu strips trailing whitespace before tokenizing, so do the same to
+  # keep scores identical to tokenize="ja".
+  return [tokenizer_ja(text.rstrip()) for text in texts]
+
+def _as_text(values):
+  # Calling bytes.decode directly is cheaper than dispatching through
+  # tf.compat.as_text for every element.
+  return [x.decode("utf-8") if isinstance(x, bytes) else x for x in values]
+
+# Inputs are tokenized by _tokenize_ja before scoring, so sacrebleu must not
+# tokenize them again.
+_BLEU_KWARGS = dict(
+    smooth_method="exp",
+    smooth_value=0.0,
+    force=False,
+    lowercase=False,
+    tokenize="none",
+    use_effective_order=False)
+
 def bleu(targets, predictions):
-  predictions = [tf.compat.as_text(x) for x in predictions]
+  predictions = _as_text(predictions)
 
   if isinstance(targets[0], list):
-    targets = [[tf.compat.as_text(x) for x in target] for target in targets]
+    targets = [_as_text(target) for target in targets]
   else:
-    targets = [tf.compat.as_text(x) for x in targets]
-    targets = [targets]
-
-  bleu_score = corpus_bleu(predictions, targets,smooth_method="exp", smooth_value=0.0,
-                 force=False,lowercase=False,tokenize="ja", use_effective_order=False)
+    targets = [_as_text(targets)]
+
+  # Tokenize everything up front in a single pass so sacrebleu only has to
+  # split on whitespace.
+  tokenized = _tokenize_ja(
+      predictions + [x for target in targets for x in target])
+  predictions = tokenized[:len(predictions)]
+  offset = len(predictions)
+  tokenized_targets = []
+  for target in targets:
+    tokenized_targets.append(tokenized[offset:offset + len(target)])
+    offset += len(target)
+  targets = tokenized_targets
+
+  bleu_score = corpus_bleu(predictions, targets, **_BLEU_KWARGS)
   return {"bleu": bleu_score.score}
 
-snow_tsv_path = {
-    "train": "./train.tsv",
-    "validation": "./val.tsv",
-    "test": "./test.tsv",
+# Generate these files from the SNOW TSVs with prepare_snow_tfrecord.py; see the
+# SNOW section of README.md.
+snow_tfrecord_path = {
+    "train": "./train.tfrecord*",
+    "validation": "./val.tfrecord*",
+    "test": "./test.tfrecord*",
 }
 
 t5.data.TaskRegistry.add(
     'snow',
-    t5.data.TextLineTask,
-    split_to_filepattern=snow_tsv_path,
-    text_preprocessor=[
-      functools.partial(
-          preprocessors.parse_tsv,
-          field_names=["inputs", "targets"]),
-    ],
+    splits=list(snow_tfrecord_path),
+    dataset_fn=functools.partial(
+        utils.tfrecord_dataset_fn,
+        split_to_filepattern=snow_tfrecord_path,
+        field_names=["inputs", "targets"]),
     output_features=DEFAULT_OUTPUT_FEATURES,
     metric_fns=[bleu])
@@ -0,0 +1,54 @@
+# Copyright 2020 The mT5 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for multilingual_t5.tasks."""
+
+from absl.testing import absltest
+
+from multilingual_t5 import tasks
+import sacrebleu
+
+
+class BleuTest(absltest.TestCase):
+
+  def test_bleu_matches_sacrebleu_ja_tokenizer(self):
+    targets = [
+        "今日は良い天気です。",
+        "私は猫が好きです。",
+        "東京は日本の首都です。",
+    ]
+    predictions = [
+        "今日はいい天気です。 ",
+        "私は犬が好きです。",
+        "東京は日本の首都です。\n",
+    ]
+
+    expected = sacrebleu.corpus_bleu(
+        predictions,
+        [targets],
+        smooth_method="exp",
+        smooth_value=0.0,
+        force=False,
+        lowercase=False,
+        tokenize="ja",
+        use_effective_order=False)
+    # Model outputs arrive as bytes; mix both types to cover decoding.
+    predictions[0] = predictions[0].encode("utf-8")
+    self.assertAlmostEqual(
+        tasks.bleu(targets, predictions)["bleu"], expected.score)
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -15,6 +15,7 @@
 """Utilities for Multilingual T5 data loading and processing.
 """
 
+import tensorflow.compat.v2 as tf
 import tensorflow_datasets as tfds
 
 
@@ -87,3 +88,32 @@ def pawsx_all_langs_dataset_fn(split="test", shuffle_files=False):
                                  tfds_name="paws_x_wiki",
                                  langs=PAWSX_LANGS)
 
+
+def tfrecord_dataset_fn(split, shuffle_files, split_to_filepattern,
+                        field_names):
+  """Creates a dataset of string examples from TFRecord files.
+
+  The files are expected to contain tf.train.Examples with one string feature
+  per field name, as written by prepare_snow_tfrecord.py. The parsed examples
+  are cached in memory, so later epochs skip reading the files. This is only
+  suitable for datasets that fit in memory.
+
+  Args:
+    split: string, which split to use.
+    shuffle_files: boolean, whether to shuffle the input files. Because the
+      examples are cached, this only affects the first pass; later epochs
+      replay the file order of the first one.
+    split_to_filepattern: dict of split name to file pattern.
+    field_names: list of strings, the names of the features to parse.
+
+  Returns:
+    A tf.data.Dataset.
+  """
+  features = {k: tf.io.FixedLenFeature([], tf.string) for k in field_names}
+  files = tf.data.Dataset.list_files(split_to_filepattern[split],
+                                     shuffle=shuffle_files)
+  ds = files.interleave(tf.data.TFRecordDataset,
+                        num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  ds = ds.map(lambda x: tf.io.parse_single_example(x, features),
+              num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  return ds.cache()
@@ -0,0 +1,54 @@
+# Copyright 2020 The mT5 Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for multilingual_t5.utils."""
+
+import os
+
+from absl.testing import absltest
+
+from multilingual_t5 import utils
+from t5.data import test_utils
+import tensorflow.compat.v2 as tf
+
+
+class UtilsTest(absltest.TestCase):
+
+  def test_tfrecord_dataset_fn(self):
+    path = os.path.join(self.create_tempdir().full_path, "train.tfrecord")
+    examples = [
+        {"inputs": "今日は良い天気です。", "targets": "It is nice today."},
+        {"inputs": "私は猫が好きです。", "targets": "I like cats."},
+    ]
+    with tf.io.TFRecordWriter(path) as writer:
+      for ex in examples:
+        ex = {k: v.encode("utf-8") for k, v in ex.items()}
+        feature = {
+            k: tf.train.Feature(bytes_list=tf.train.BytesList(value=[v]))
+            for k, v in ex.items()
+        }
+        writer.write(tf.train.Example(
+            features=tf.train.Features(feature=feature)).SerializeToString())
+
+    dataset = utils.tfrecord_dataset_fn(
+        split="train",
+        shuffle_files=False,
+        split_to_filepattern={"train": path + "*"},
+        field_names=["inputs", "targets"])
+    test_utils.assert_dataset(dataset, examples)
+
+
+if __name__ == "__main__":
+  absltest.main()